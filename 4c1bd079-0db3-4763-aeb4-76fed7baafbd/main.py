@@ -1,19 +1,93 @@
 # Import necessary components from Surmount
 from surmount.base_class import Strategy, TargetAllocation
-from surmount.technical_indicators import EMA, VWAP
+from surmount.technical_indicators import VWAP
 from surmount.logging import log
+import numpy as np
+import math
 import traceback # Import for detailed error logging
+from collections import namedtuple
+
+_LOG_ENABLED = True # Set to False to skip strategy logging (and its message formatting) entirely, e.g. for sweeps
+
+# Struct-of-arrays view of the OHLCV bars: one contiguous float64 array per field
+_Bars = namedtuple("_Bars", ("close", "high", "low", "volume"))
+
+def _seed_emas(closes, lengths):
+    # Closed form of the SMA-seeded EMA recurrence, one weight row per length, so every seed
+    # comes out of a single matrix-vector pass over the closes:
+    # ema = (1-a)^m * sma(closes[:length]) + sum_j a*(1-a)^(m-1-j) * closes[length+j]
+    count = len(closes)
+    if count < max(lengths):
+        return None
+    weights = np.empty((len(lengths), count))
+    for row, length in zip(weights, lengths):
+        alpha = 2.0 / (length + 1)
+        m = count - length
+        row[:length] = (1 - alpha) ** m / length
+        row[length:] = alpha * (1 - alpha) ** np.arange(m - 1, -1, -1)
+    return weights @ closes
+
+def _bars_since(ohlcv_list, ticker, ts, limit):
+    # How many bars follow the one stamped ts, if it is among the last `limit` bars
+    for back in range(2, min(limit, len(ohlcv_list)) + 1):
+        if ohlcv_list[-back].get(ticker, {}).get("date") == ts:
+            return back - 1
+    return None
+
+def _last(raw):
+    # Surmount indicators return a series or a scalar; take the latest value as a float, or None (also for NaN)
+    try:
+        value = float(raw[-1] if hasattr(raw, "__getitem__") else raw)
+    except (TypeError, ValueError, IndexError):
+        return None
+    return None if math.isnan(value) else value
+
+def _logf(enabled, msg, *args):
+    # %-style logging: the message is only formatted when it is actually emitted
+    if enabled:
+        log(msg % args if args else msg)
+
+def _vwap_sums(prices, volumes):
+    # Running-sum form of VWAP, sum(p*v) / sum(v), so the caller can keep extending it
+    return float(prices @ volumes), float(volumes.sum())
 
 # Define the strategy class
 class TradingStrategy(Strategy):
+    # Per-bar state lives in slots rather than the instance __dict__
+    __slots__ = ("tickers", "_ema_state", "_vwap_state", "_series", "_err_logged", "_last_key", "_last_alloc", "_last_stakes", "_warmup_bars")
+
+    INTERVAL = "1min" # Bar timeframe; subclasses override to run the same logic on another interval
+
+    # Constants fixed at class creation instead of being recomputed on every bar
+    _ALPHA_9 = 2 / (9 + 1) # EMA smoothing factor 2/(length+1)
+    _ALPHA_20 = 2 / (20 + 1)
+    _DECAY_9 = 1 - _ALPHA_9 # Weight kept by the previous EMA value
+    _DECAY_20 = 1 - _ALPHA_20
+    _TOL = 1e-9 # Holdings below this are treated as flat
+    _SEED_WINDOW = 200 # Bars used to seed an EMA: 10x the slowest length, older closes weigh < 2e-8
+    _LONG_STAKE = 0.10
+
+    # Signal tables indexed by comparison bitmasks (see _target_stake()) instead of nested if/and/or chains
+    _ENTRY_TABLE = (0,) * 15 + (_LONG_STAKE,) # Only all four entry conditions together open a long
+    _EXIT_STOP, _EXIT_TREND = 1, 2
+    _EXIT_TABLE = (0,) + (_EXIT_TREND,) * 3 + (_EXIT_STOP,) * 4 # Stop-loss bit (0b100) wins over trend bits
+
     def __init__(self):
         self.tickers = ["SPY"] # Define the assets to trade
-        log("Strategy Initialized.")
+        # Indicator state carried across bars so each run() only folds in the newest bar
+        self._ema_state = {} # ticker -> (last_timestamp, ema9, ema20)
+        self._vwap_state = {} # ticker -> (last_timestamp, session_date, sum_pv, sum_v)
+        self._series = None # (ticker, start, _Bars) extracted for the current run() only
+        self._err_logged = set() # Tickers whose indicator error traceback has already been logged
+        self._last_key = None # (latest bar timestamp, holdings) of the previous run()
+        self._last_alloc = None # TargetAllocation returned for _last_key
+        self._last_stakes = None # Stake (single ticker) or stakes tuple (in ticker order) held by _last_alloc
+        self._warmup_bars = 0 # Bars with too little history, used to rate-limit the warm-up log
+        _logf(_LOG_ENABLED, "Strategy Initialized.")
 
     @property
     def interval(self):
-        # Use a 5-minute timeframe
-        return "1min" # Correct interval string
+        return self.INTERVAL
 
     @property
     def assets(self):
@@ -23,97 +97,191 @@ class TradingStrategy(Strategy):
     def data(self):
         return []
 
+    def _arrays(self, ticker, ohlcv_list, start):
+        # Struct-of-arrays copy of ohlcv_list[start:] as contiguous float64 buffers, shared by every indicator seeded in this run()
+        start = max(start, 0)
+        if self._series is None or self._series[0] != ticker or self._series[1] > start:
+            window = ohlcv_list[start:]
+            self._series = (ticker, start, _Bars._make(
+                np.fromiter((step[ticker][field] for step in window), dtype=np.float64, count=len(window))
+                for field in _Bars._fields))
+        offset = start - self._series[1]
+        return _Bars._make(series[offset:] for series in self._series[2])
+
+    def _emas(self, ticker, ohlcv_list, ts, prev_ts):
+        # EMA is a one-pole recurrence: once seeded, both EMAs advance together with one multiply-add each per bar
+        cached = self._ema_state.get(ticker)
+        if ts is not None and cached is not None:
+            if cached[0] == ts: # Same bar delivered again
+                return cached[1], cached[2]
+            # Bars since the cache was last advanced: normally just this one, more if run() skipped some
+            missed = 1 if cached[0] == prev_ts else _bars_since(ohlcv_list, ticker, cached[0], self._SEED_WINDOW)
+            if missed is not None:
+                ema9_val, ema20_val = cached[1], cached[2]
+                for step in ohlcv_list[-missed:]:
+                    close = step[ticker]["close"]
+                    ema9_val = self._ALPHA_9 * close + self._DECAY_9 * ema9_val
+                    ema20_val = self._ALPHA_20 * close + self._DECAY_20 * ema20_val
+                self._ema_state[ticker] = (ts, ema9_val, ema20_val)
+                return ema9_val, ema20_val
+
+        # Cold start, or cached bar no longer in recent history: seed once from the recent history
+        seeds = _seed_emas(self._arrays(ticker, ohlcv_list, len(ohlcv_list) - self._SEED_WINDOW).close, (9, 20))
+        if seeds is None:
+            self._ema_state.pop(ticker, None)
+            return None, None
+        ema9_val, ema20_val = float(seeds[0]), float(seeds[1])
+        if ts is not None:
+            self._ema_state[ticker] = (ts, ema9_val, ema20_val)
+        return ema9_val, ema20_val
+
+    def _vwap(self, ticker, ohlcv_list, ts, prev_ts):
+        if ts is None: # Sessions can't be tracked without timestamps
+            return _last(VWAP(ticker=ticker, data=ohlcv_list, length=1))
+
+        # Session VWAP is a ratio of running sums of typical_price*volume and volume.
+        # The sums are float64 and restart every session, so rounding drift is bounded by one
+        # session's worth of additions (~n * 1e-16 relative) and needs no compensated summation.
+        session = ts[:10]
+        cached = self._vwap_state.get(ticker)
+        missed = None
+        if cached is not None:
+            if cached[0] == ts: # Same bar delivered again
+                return cached[2] / cached[3] if cached[3] else None
+            # Bars since the sums were last extended: normally just this one, more if run() skipped some
+            missed = 1 if cached[0] == prev_ts else _bars_since(ohlcv_list, ticker, cached[0], self._SEED_WINDOW)
+
+        if missed is not None:
+            # Extend the running sums bar by bar, restarting them whenever a new session opens
+            sum_session, sum_pv, sum_v = cached[1], cached[2], cached[3]
+            for step in ohlcv_list[-missed:]:
+                bar = step[ticker]
+                volume, bar_session = bar["volume"], bar["date"][:10]
+                bar_pv = (bar["high"] + bar["low"] + bar["close"]) / 3 * volume # Typical price (hlc3) times volume
+                if bar_session == sum_session:
+                    sum_pv, sum_v = sum_pv + bar_pv, sum_v + volume
+                else:
+                    sum_session, sum_pv, sum_v = bar_session, bar_pv, volume
+        else:
+            # Cold start, or cached bar no longer in recent history: sum the current session's bars once
+            start = len(ohlcv_list) - 1
+            while start > 0 and ohlcv_list[start - 1].get(ticker, {}).get("date", "")[:10] == session:
+                start -= 1
+            bars = self._arrays(ticker, ohlcv_list, start)
+            sum_pv, sum_v = _vwap_sums((bars.high + bars.low + bars.close) / 3, bars.volume)
+        self._vwap_state[ticker] = (ts, session, sum_pv, sum_v)
+        return sum_pv / sum_v if sum_v else None
+
+    def _target_stake(self, ticker, ohlcv_list, current_holding, log_on):
+        ema9_val, ema20_val, vwap_val = None, None, None
+        current_close = None
+        latest_bar = ohlcv_list[-1]
+        bar = latest_bar.get(ticker) # This ticker's latest bar, looked up once
+
+        if bar is None:
+             _logf(log_on, "Ticker %s not found in the latest data step: %s", ticker, latest_bar)
+             return current_holding
+
+        try:
+            # Timestamps of this bar and the previous one decide whether cached state can be advanced
+            ts = bar.get("date")
+            prev_ts = ohlcv_list[-2].get(ticker, {}).get("date")
+
+            ema9_val, ema20_val = self._emas(ticker, ohlcv_list, ts, prev_ts)
+            vwap_val = self._vwap(ticker, ohlcv_list, ts, prev_ts)
+
+            current_close = float(bar["close"])
+
+        except Exception as e:
+            if ticker in self._err_logged: # Full traceback already logged once for this ticker
+                _logf(log_on, "Error (suppressed) for %s: %r", ticker, e)
+            elif log_on: # Arguments are evaluated eagerly, so only walk the traceback when it will be logged
+                _logf(True, "Error during indicator calculation or data access for %s: %s", ticker, e)
+                _logf(True, "DEBUG: Exception Type: %s", type(e))
+                _logf(True, "DEBUG: Traceback: %s", traceback.format_exc())
+                self._err_logged.add(ticker)
+            return current_holding
+
+        if ema9_val is None or ema20_val is None or vwap_val is None or math.isnan(ema9_val + ema20_val + vwap_val + current_close):
+             # A NaN would persist in the running state, so drop only the state that is bad and reseed it on the next bar
+             # (a None VWAP from a zero-volume session so far is legitimate and leaves the EMA state alone)
+             bad_close = math.isnan(current_close)
+             if bad_close or ema9_val is None or ema20_val is None or math.isnan(ema9_val + ema20_val):
+                 self._ema_state.pop(ticker, None)
+             if bad_close or (vwap_val is not None and math.isnan(vwap_val)):
+                 self._vwap_state.pop(ticker, None)
+             _logf(log_on, "Indicator/Price values invalid after calculation for %s. EMA9: %s, EMA20: %s, VWAP: %s, Close: %s", ticker, ema9_val, ema20_val, vwap_val, current_close)
+             return current_holding
+
+        # Two comparisons instead of abs(): same tolerance band, no function call
+        currently_invested = current_holding > self._TOL or current_holding < -self._TOL
+
+        # --- Entry Logic (Long Only) ---
+        # Uptrend (close > VWAP, EMA9 > EMA20) plus a pullback between the EMAs, packed into one mask.
+        # Short entries were removed: negative stakes fail TargetAllocation's validation.
+        if not currently_invested:
+            entry_mask = ((current_close > vwap_val) << 3 | (ema9_val > ema20_val) << 2
+                          | (current_close < ema9_val) << 1 | (current_close > ema20_val))
+            target_stake = self._ENTRY_TABLE[entry_mask]
+            if target_stake:
+                _logf(log_on, "LONG ENTRY SIGNAL: %s at %.2f", ticker, current_close)
+            return target_stake
+
+        # --- Exit Logic (Only applies to Long Positions now) ---
+        if current_holding > 0: # Check specifically for long holding
+            # Stop loss below EMA20 takes precedence over a trend break (close < VWAP or EMA9 < EMA20)
+            exit_mask = (current_close < ema20_val) << 2 | (current_close < vwap_val) << 1 | (ema9_val < ema20_val)
+            exit_signal = self._EXIT_TABLE[exit_mask]
+            if exit_signal == self._EXIT_STOP:
+                _logf(log_on, "STOP LOSS (Long): %s exit at %.2f. Stop level: %.2f", ticker, current_close, ema20_val)
+            elif exit_signal == self._EXIT_TREND:
+                _logf(log_on, "EXIT LONG (Trend Break): %s at %.2f", ticker, current_close)
+
+            if exit_signal:
+                return 0 # Close position
+            return current_holding # Maintain position
+
+        # --- Holding is negative (shouldn't happen now) ---
+        _logf(log_on, "Warning: Holding %s is negative (%s) but strategy is long-only. Exiting.", ticker, current_holding)
+        return 0
+
     def run(self, data):
-        allocation_dict = {}
+        self._series = None
+        log_on = _LOG_ENABLED and bool(getattr(log, "enabled", True)) # Surmount may expose a switch to silence logging
         ohlcv_list = data.get("ohlcv")
 
         if ohlcv_list is None or len(ohlcv_list) < 50:
-            log(f"Not enough historical steps in ohlcv_list (need ~50)")
-            for ticker in self.tickers: allocation_dict[ticker] = 0
-            return TargetAllocation(allocation_dict)
-
-        for ticker in self.tickers:
-            ema9_val, ema20_val, vwap_val = None, None, None
-            current_close = None
-
-            if ticker not in ohlcv_list[-1]:
-                 log(f"Ticker {ticker} not found in the latest data step: {ohlcv_list[-1]}")
-                 allocation_dict[ticker] = data["holdings"].get(ticker, 0)
-                 continue
-
-            try:
-                historical_data = ohlcv_list # Use the full list for indicators
-                ema9_raw = EMA(ticker=ticker, data=historical_data, length=9)
-                ema20_raw = EMA(ticker=ticker, data=historical_data, length=20)
-                vwap_raw = VWAP(ticker=ticker, data=historical_data, length=1)
-
-                ema9_val = ema9_raw[-1] if isinstance(ema9_raw, list) and ema9_raw else ema9_raw if isinstance(ema9_raw, (int,float)) else None
-                ema20_val = ema20_raw[-1] if isinstance(ema20_raw, list) and ema20_raw else ema20_raw if isinstance(ema20_raw, (int,float)) else None
-                vwap_val = vwap_raw[-1] if isinstance(vwap_raw, list) and vwap_raw else vwap_raw if isinstance(vwap_raw, (int,float)) else None
-
-                current_close = ohlcv_list[-1][ticker]["close"]
-
-            except Exception as e:
-                log(f"Error during indicator calculation or data access for {ticker}: {e}")
-                log(f"DEBUG: Exception Type: {type(e)}")
-                log(f"DEBUG: Traceback: {traceback.format_exc()}")
-                allocation_dict[ticker] = data["holdings"].get(ticker, 0)
-                continue
-
-            if not all(isinstance(v, (int, float)) for v in [ema9_val, ema20_val, vwap_val, current_close]):
-                 log(f"Indicator/Price values invalid after calculation for {ticker}. EMA9: {ema9_val}, EMA20: {ema20_val}, VWAP: {vwap_val}, Close: {current_close}")
-                 allocation_dict[ticker] = data["holdings"].get(ticker, 0)
-                 continue
-
-            current_holding = data["holdings"].get(ticker, 0)
-            currently_invested = abs(current_holding) > 1e-9
-
-            is_uptrend_condition = current_close > vwap_val and ema9_val > ema20_val
-            # is_downtrend_condition = current_close < vwap_val and ema9_val < ema20_val # Not needed for long-only
-            long_pullback = current_close < ema9_val and current_close > ema20_val
-            # short_pullback = current_close > ema9_val and current_close < ema20_val # Not needed for long-only
-
-            # --- Entry Logic (Long Only) ---
-            if not currently_invested:
-                target_stake = 0
-                if is_uptrend_condition and long_pullback:
-                    log(f"LONG ENTRY SIGNAL: {ticker} at {current_close:.2f}")
-                    target_stake = 0.10
-                # --- REMOVED SHORT ENTRY BLOCK ---
-                # elif is_downtrend_condition and short_pullback:
-                #     log(f"SHORT ENTRY SIGNAL: {ticker} at {current_close:.2f}")
-                #     target_stake = -0.10 # This caused the AssertionError
-                # --- END REMOVED BLOCK ---
-                allocation_dict[ticker] = target_stake
-
-            # --- Exit Logic (Only applies to Long Positions now) ---
-            elif current_holding > 0: # Check specifically for long holding
-                exit_signal = False
-                if current_close < ema20_val: # Long SL
-                    log(f"STOP LOSS (Long): {ticker} exit at {current_close:.2f}. Stop level: {ema20_val:.2f}")
-                    exit_signal = True
-
-                if not exit_signal: # Trend Exit Check for Long
-                    if current_close < vwap_val or ema9_val < ema20_val:
-                           log(f"EXIT LONG (Trend Break): {ticker} at {current_close:.2f}")
-                           exit_signal = True
-
-                if exit_signal:
-                    allocation_dict[ticker] = 0 # Close position
-                else:
-                    allocation_dict[ticker] = current_holding # Maintain position
-            
-            # --- Added case for if holding is somehow negative (shouldn't happen now) ---
-            elif current_holding < 0:
-                 log(f"Warning: Holding {ticker} is negative ({current_holding}) but strategy is long-only. Exiting.")
-                 allocation_dict[ticker] = 0
+            self._warmup_bars += 1
+            _logf(log_on and self._warmup_bars % 100 == 1, "Not enough historical steps in ohlcv_list (need ~50)")
+            return TargetAllocation({ticker: 0 for ticker in self.tickers})
 
+        holdings = data.get("holdings") or {} # Looked up once per bar; missing holdings mean flat
+        latest_bar = ohlcv_list[-1]
+        t0 = self.tickers[0] if len(self.tickers) == 1 else None # Read per run(): subclasses may reassign tickers after __init__
 
-            # --- Maintain Allocation ---
-            if ticker not in allocation_dict:
-                 allocation_dict[ticker] = data["holdings"].get(ticker, 0)
+        # Same bar and same holdings as the previous call: the answer can't have changed
+        if t0 is not None: # Single-asset fast path: no per-ticker loop or holdings tuple
+            current_holding = holdings.get(t0, 0)
+            run_key = (latest_bar.get(t0, {}).get("date"), current_holding)
+        else:
+            run_key = (latest_bar.get(self.tickers[0], {}).get("date"), tuple(holdings.get(ticker, 0) for ticker in self.tickers))
+        if run_key[0] is None: # Bars without timestamps are never memoized
+            run_key = None
+        elif run_key == self._last_key:
+            return self._last_alloc
 
         # --- Return Target Allocation ---
-        final_allocation = {ticker: allocation_dict.get(ticker, data["holdings"].get(ticker, 0)) for ticker in self.tickers}
-        # The sum of final_allocation values should now always be >= 0
-        return TargetAllocation(final_allocation)
\ No newline at end of file
+        # The sum of allocation values should now always be >= 0
+        # Holding steady between signals yields the same stakes, so reuse the previous TargetAllocation
+        if t0 is not None: # Single-asset key is the bare stake; the dict is only built when it changes
+            stakes = self._target_stake(t0, ohlcv_list, current_holding, log_on)
+            if stakes != self._last_stakes:
+                self._last_alloc = TargetAllocation({t0: stakes})
+        else:
+            allocation_dict = {ticker: self._target_stake(ticker, ohlcv_list, holdings.get(ticker, 0), log_on) for ticker in self.tickers}
+            stakes = tuple(allocation_dict.values())
+            if stakes != self._last_stakes:
+                self._last_alloc = TargetAllocation(allocation_dict)
+        self._last_stakes = stakes
+        self._last_key = run_key
+        return self._last_alloc
\ No newline at end of file